@@ -6,27 +6,17 @@ from sklearn.model_selection import train_test_split
 from sklearn.linear_model import LogisticRegression
 from sklearn.metrics import accuracy_score, classification_report
 from sklearn.preprocessing import LabelEncoder
-import nltk # Para procesar texto
-from nltk.corpus import stopwords
-from nltk.stem import SnowballStemmer
 import re # Para limpiar texto
+import os
+from recursos_nlp import cargar_recursos, tokenizar # Stopwords, Punkt y stemmer sin tocar la red
 
 # Necesitamos estas funciones de db_manager para hablar con el diario
-from db_manager import get_all_menciones, add_calified_lead, get_all_leads_calificados, get_all_empresas, DB_NAME
+from db_manager import get_all_menciones, add_calified_leads_batch, get_all_leads_calificados, get_all_empresas, DB_NAME
 import sqlite3
-
-# --- Descarga de recursos de NLTK (ajustado para capturar LookupError) ---
-# Hemos intentado descargar antes, pero este bloque es para asegurar que si faltan, se pida.
-# Sin embargo, como ya los descargamos manualmente, esta sección es más por robustez.
-try:
-    nltk.data.find('corpora/stopwords')
-    nltk.data.find('tokenizers/punkt')
-except LookupError: # <--- ¡CAMBIO AQUÍ! Capturamos LookupError directamente
-    print("Descargando recursos de NLTK (stopwords, punkt)... esto solo se hace una vez.")
-    nltk.download('stopwords')
-    nltk.download('punkt')
-    print("Recursos de NLTK descargados.")
-
+from duplicados import indexar_pendientes
+from procesamiento_paralelo import (
+    FRAGMENTOS_POR_PROCESO, rangos_de_ids, guardar_artefacto, cargar_artefacto, numero_de_procesos, calificar_en_paralelo,
+)
 
 # --- Preparar los "Libros de Entrenamiento" del Cerebro ---
 def prepare_training_data():
@@ -68,14 +58,14 @@ def prepare_training_data():
     return pd.DataFrame(data)
 
 # --- Limpieza de Texto (para que el Cerebro entienda mejor) ---
-stemmer = SnowballStemmer('spanish')
-stopwords_es = set(stopwords.words('spanish'))
-
+# Los recursos de NLTK vienen del paquete local recursos_nlp.pkl (ver recursos_nlp.py)
 def clean_text(text):
+    recursos = cargar_recursos()
+    stopwords_es, stemmer = recursos['stopwords'], recursos['stemmer']
     text = text.lower() # Todo a minúsculas
     text = re.sub(r'\d+', '', text) # Quitar números
     text = re.sub(r'[^\w\s]', '', text) # Quitar puntuación
-    tokens = nltk.word_tokenize(text) # Dividir en palabras
+    tokens = tokenizar(text) # Dividir en palabras
     tokens = [word for word in tokens if word not in stopwords_es] # Quitar palabras comunes
     tokens = [stemmer.stem(word) for word in tokens] # Reducir palabras a su raíz (ej. "corriendo" -> "corr")
     return " ".join(tokens)
@@ -104,51 +94,238 @@ def train_ai_brain():
 
     return model_calificacion, model_necesidad, vectorizer, encoder_necesidad
 
+# --- Juntar las Pistas de Cada Empresa ---
+REGLAS_AGREGACION = ('max', 'media', 'reciente')
+
+def agregar_por_empresa(df_puntuado, regla='max', vida_media_dias=30):
+    """
+    Combina las menciones calificadas de cada empresa en una sola puntuación.
+    `df_puntuado` necesita las columnas mencion_id, empresa_id, fecha_mencion,
+    es_calificado, probabilidad y necesidad. Solo cuentan las menciones que la IA
+    considera buenos leads.
+
+    Reglas:
+      - 'max': la probabilidad más alta de la empresa.
+      - 'media': el promedio de probabilidades.
+      - 'reciente': promedio ponderado donde una mención pierde la mitad de su peso
+        cada `vida_media_dias` días de antigüedad.
+    La necesidad es siempre la de la mención con mayor probabilidad (empates: menor mencion_id),
+    así el resultado no depende del orden de lectura.
+    """
+    if regla not in REGLAS_AGREGACION:
+        raise ValueError(f"Regla de agregación desconocida: {regla}. Usa una de {REGLAS_AGREGACION}.")
+
+    df = df_puntuado[df_puntuado['es_calificado'] == 1]
+    if df.empty:
+        return pd.DataFrame(columns=['empresa_id', 'puntuacion_intencion', 'necesidad_diagnosticada'])
+
+    df = df.sort_values(['empresa_id', 'probabilidad', 'mencion_id'], ascending=[True, False, True])
+    grupos = df.groupby('empresa_id', sort=True)
+    necesidad = grupos['necesidad'].first()
+
+    if regla == 'max':
+        probabilidad = grupos['probabilidad'].max()
+    elif regla == 'media':
+        probabilidad = grupos['probabilidad'].mean()
+    else:
+        fechas = pd.to_datetime(df['fecha_mencion'], errors='coerce')
+        edad_dias = (fechas.max() - fechas).dt.total_seconds() / 86400
+        pesos = 0.5 ** (edad_dias.fillna(edad_dias.max()).fillna(0) / vida_media_dias)
+        ponderado = (df['probabilidad'] * pesos).groupby(df['empresa_id']).sum()
+        probabilidad = ponderado / pesos.groupby(df['empresa_id']).sum()
+
+    return pd.DataFrame({
+        'empresa_id': probabilidad.index,
+        'puntuacion_intencion': (probabilidad.values * 100).astype(int), # Escala de 0 a 100
+        'necesidad_diagnosticada': necesidad.reindex(probabilidad.index).values,
+    })
+
 # --- Calificar Nuevos Leads ---
-def qualify_new_leads():
+ARTEFACTO_PATH = 'cerebro_ai_brain.joblib' # Modelos compartidos con los procesos del modo paralelo
+
+CONSULTA_MENCIONES = """
+    SELECT m.id AS mencion_id, m.empresa_id, m.texto_mencion, m.fecha_mencion, e.nombre AS nombre_empresa,
+           COALESCE(mh.cluster_id, m.id) AS cluster_id
+    FROM menciones m
+    JOIN empresas e ON m.empresa_id = e.id
+    LEFT JOIN menciones_minhash mh ON mh.mencion_id = m.id
+"""
+
+# Solo se califica un representante por grupo de casi duplicados (ver duplicados.py):
+# la mención de menor id que sigue en el diario. Las menciones sin firma son su propio grupo.
+FILTRO_REPRESENTANTES = """
+    (mh.cluster_id IS NULL OR m.id = (
+        SELECT MIN(mh2.mencion_id)
+        FROM menciones_minhash mh2
+        JOIN menciones m2 ON m2.id = mh2.mencion_id
+        WHERE mh2.cluster_id = mh.cluster_id
+    ))
+"""
+
+# Todas las menciones con su grupo, sin el texto: para repartir el resultado del representante
+CONSULTA_GRUPOS = """
+    SELECT m.id AS mencion_id, m.empresa_id, m.fecha_mencion, COALESCE(mh.cluster_id, m.id) AS cluster_id
+    FROM menciones m
+    JOIN empresas e ON m.empresa_id = e.id
+    LEFT JOIN menciones_minhash mh ON mh.mencion_id = m.id
+"""
+
+def propagar_a_duplicados(df_representantes):
     """
-    Lee nuevas menciones del diario, las califica con la IA y guarda los resultados.
+    Copia la calificación de cada representante a todas las menciones de su grupo.
+    Devuelve una fila por mención, lista para `agregar_por_empresa`.
     """
-    model_calificacion, model_necesidad, vectorizer, encoder_necesidad = train_ai_brain()
-    
-    # Obtener todas las menciones (asumimos que todas podrían necesitar recalificación)
     conn = sqlite3.connect(DB_NAME)
-    query = """
-        SELECT m.id AS mencion_id, m.empresa_id, m.texto_mencion, m.fecha_mencion, e.nombre AS nombre_empresa
-        FROM menciones m
-        JOIN empresas e ON m.empresa_id = e.id
-    """
-    df_menciones = pd.read_sql_query(query, conn)
+    df_grupos = pd.read_sql_query(CONSULTA_GRUPOS, conn)
     conn.close()
 
-    if df_menciones.empty:
-        return "No hay nuevas menciones en el diario para calificar."
+    df_grupos = df_grupos.merge(
+        df_representantes[['mencion_id', 'cluster_id']].rename(columns={'mencion_id': 'representante_id'}),
+        on='cluster_id', how='left'
+    )
+    # Menciones cuyo grupo no tiene representante en esta lectura (p. ej. se añadieron después)
+    # no se califican en esta pasada
+    df_grupos = df_grupos.dropna(subset=['representante_id'])
+    df_grupos['representante_id'] = df_grupos['representante_id'].astype(int)
+
+    resultados = df_representantes[['mencion_id', 'es_calificado', 'probabilidad', 'necesidad']].rename(
+        columns={'mencion_id': 'representante_id'}
+    )
+    return df_grupos.merge(resultados, on='representante_id', how='inner')
+
+def puntuar_menciones(df_menciones, artefactos):
+    """
+    Añade a `df_menciones` las columnas es_calificado, probabilidad y necesidad
+    usando los modelos devueltos por `train_ai_brain`.
+    """
+    model_calificacion, model_necesidad, vectorizer, encoder_necesidad = artefactos
 
     # Limpiar y transformar el texto de las nuevas menciones
     df_menciones['texto_limpio'] = df_menciones['texto_mencion'].apply(clean_text)
     X_new_text = vectorizer.transform(df_menciones['texto_limpio'])
 
     # Predicción de calificación (0 o 1) y probabilidad (0 a 1)
-    pred_calificacion = model_calificacion.predict(X_new_text)
-    pred_proba = model_calificacion.predict_proba(X_new_text)[:, 1] # Probabilidad de ser clase 1 (buen lead)
+    df_menciones['es_calificado'] = model_calificacion.predict(X_new_text)
+    df_menciones['probabilidad'] = model_calificacion.predict_proba(X_new_text)[:, 1] # Probabilidad de ser clase 1 (buen lead)
 
     # Predicción de necesidad
     pred_necesidad_encoded = model_necesidad.predict(X_new_text)
-    pred_necesidad = encoder_necesidad.inverse_transform(pred_necesidad_encoded)
-
-    calificados_count = 0
-    for i, row in df_menciones.iterrows():
-        if pred_calificacion[i] == 1: # Si la IA dice que es un buen lead
-            puntuacion = int(pred_proba[i] * 100) # Convertir a escala de 0 a 100
-            necesidad = pred_necesidad[i]
-            
-            success, msg = add_calified_lead(row['empresa_id'], puntuacion, necesidad)
-            if success:
-                calificados_count += 1
-            else:
-                print(f"Error al guardar lead calificado para {row['nombre_empresa']}: {msg}")
-
-    return f"¡Cerebro Adivinador: {calificados_count} leads calificados y actualizados en el diario!"
+    df_menciones['necesidad'] = encoder_necesidad.inverse_transform(pred_necesidad_encoded)
+    return df_menciones
+
+# --- Calentamiento: dejar todo cargado antes de la primera calificación ---
+MENCIONES_CALENTAMIENTO = [
+    "Buscan automatizar sus procesos y necesitan un nuevo CRM.",
+    "Reportan pérdidas por problemas en la cadena de suministro.",
+]
+_artefactos_calientes = None
+
+def _ejecutar_lote_de_prueba(artefactos):
+    """Califica un lote ficticio para que la primera calificación real no pague la inicialización."""
+    puntuar_menciones(pd.DataFrame({'texto_mencion': MENCIONES_CALENTAMIENTO}), artefactos)
+
+def calentar(artefacto_path=ARTEFACTO_PATH):
+    """
+    Prepara el proceso para calificar: carga el paquete de recursos de NLP, carga los modelos
+    ya entrenados desde `artefacto_path` (o los entrena y guarda si no existen) y ejecuta un
+    lote de prueba. Las siguientes llamadas a qualify_new_leads reutilizan estos modelos.
+    """
+    global _artefactos_calientes
+    cargar_recursos()
+    if os.path.exists(artefacto_path):
+        artefactos = cargar_artefacto(artefacto_path)
+    else:
+        artefactos = train_ai_brain()
+        guardar_artefacto(artefactos, artefacto_path)
+    _ejecutar_lote_de_prueba(artefactos)
+    _artefactos_calientes = artefactos
+    return artefactos
+
+# --- Modo paralelo: cada proceso califica un rango de ids de 'menciones' ---
+_artefactos_proceso = None
+
+def _iniciar_proceso(artefacto_path):
+    """Se ejecuta una vez por proceso: carga los modelos y los calienta."""
+    global _artefactos_proceso
+    _artefactos_proceso = cargar_artefacto(artefacto_path)
+    _ejecutar_lote_de_prueba(_artefactos_proceso)
+
+def _calificar_fragmento(inicio, fin):
+    """Lee y califica las menciones con id entre `inicio` y `fin`. No escribe nada."""
+    conn = sqlite3.connect(DB_NAME)
+    try:
+        df = pd.read_sql_query(
+            CONSULTA_MENCIONES + f" WHERE m.id BETWEEN ? AND ? AND {FILTRO_REPRESENTANTES}",
+            conn, params=(inicio, fin)
+        )
+    finally:
+        conn.close()
+
+    if df.empty:
+        return df
+    df = puntuar_menciones(df, _artefactos_proceso)
+    return df[['mencion_id', 'cluster_id', 'es_calificado', 'probabilidad', 'necesidad']]
+
+def _puntuar_en_paralelo(artefactos, n_procesos):
+    """Califica los representantes repartiéndolos en fragmentos entre `n_procesos` procesos."""
+    n_procesos = numero_de_procesos(n_procesos)
+    rangos = rangos_de_ids(DB_NAME, 'menciones', n_procesos * FRAGMENTOS_POR_PROCESO, columna='id')
+    if not rangos:
+        return pd.DataFrame()
+
+    # Los modelos de `calentar()` ya están en disco (y memoria-mapeados): no se sobrescriben
+    if artefactos is not _artefactos_calientes:
+        guardar_artefacto(artefactos, ARTEFACTO_PATH)
+    resultados = calificar_en_paralelo(_calificar_fragmento, rangos, _iniciar_proceso, (ARTEFACTO_PATH,), n_procesos)
+    resultados = [df for df in resultados if not df.empty]
+    return pd.concat(resultados, ignore_index=True) if resultados else pd.DataFrame()
+
+def qualify_new_leads(regla='max', vida_media_dias=30, n_procesos=1):
+    """
+    Lee nuevas menciones del diario, las califica con la IA y guarda los resultados.
+    Las menciones se agregan por empresa (ver `agregar_por_empresa`) antes de escribir,
+    así cada empresa recibe una sola actualización.
+    Con `n_procesos` > 1 (o None para usar todos los núcleos) la calificación se reparte
+    entre varios procesos; la escritura la sigue haciendo solo este proceso.
+    Si antes se llamó a `calentar()`, se reutilizan sus modelos en lugar de reentrenar.
+    Las menciones casi duplicadas se califican una sola vez: se puntúa el representante
+    de cada grupo y su resultado se copia al resto (ver `propagar_a_duplicados`).
+    """
+    artefactos = _artefactos_calientes or train_ai_brain()
+
+    # Firmar las menciones que se guardaron sin pasar por add_mencion
+    indexar_pendientes(DB_NAME)
+
+    if n_procesos != 1:
+        df_representantes = _puntuar_en_paralelo(artefactos, n_procesos)
+    else:
+        # Obtener todas las menciones (asumimos que todas podrían necesitar recalificación)
+        conn = sqlite3.connect(DB_NAME)
+        df_representantes = pd.read_sql_query(CONSULTA_MENCIONES + f" WHERE {FILTRO_REPRESENTANTES}", conn)
+        conn.close()
+        if not df_representantes.empty:
+            df_representantes = puntuar_menciones(df_representantes, artefactos)
+
+    if df_representantes.empty:
+        return "No hay nuevas menciones en el diario para calificar."
+
+    df_menciones = propagar_a_duplicados(df_representantes)
+    print(f"Se calificaron {len(df_representantes)} representantes para {len(df_menciones)} menciones.")
+
+    df_empresas = agregar_por_empresa(df_menciones, regla=regla, vida_media_dias=vida_media_dias)
+    if df_empresas.empty:
+        return "¡Cerebro Adivinador: 0 leads calificados y actualizados en el diario!"
+
+    registros = [
+        (int(empresa_id), int(puntuacion), necesidad)
+        for empresa_id, puntuacion, necesidad in df_empresas.itertuples(index=False)
+    ]
+    success, msg = add_calified_leads_batch(registros)
+    if not success:
+        print(f"Error al guardar leads calificados: {msg}")
+        return "¡Cerebro Adivinador: 0 leads calificados y actualizados en el diario!"
+
+    return f"¡Cerebro Adivinador: {len(registros)} leads calificados y actualizados en el diario!"
 
 if __name__ == '__main__':
     # Asegúrate de que db_manager.py ya creó el leads.db y tienes algunas menciones
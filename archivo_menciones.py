@@ -0,0 +1,167 @@
+# archivo_menciones.py
+#
+# "Archivo histórico" del diario: las menciones antiguas salen de SQLite y se guardan
+# en archivos Parquet por columnas, particionados por mes (mes=AAAA-MM).
+# Así la base de datos "caliente" se mantiene pequeña y quien necesite el historial
+# completo (entrenamiento, reportes) puede leer solo las columnas que usa.
+
+import datetime
+import os
+import sqlite3
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from db_manager import asegurar_id_menciones_nuevas
+
+ARCHIVO_DIR = 'archivo_menciones'
+
+# Base de datos donde vive cada tabla de menciones
+TABLAS = {
+    'menciones_nuevas': 'diario_leads.db',
+    'menciones': 'leads.db',
+}
+
+# Tipos de Arrow según el tipo declarado en SQLite
+_TIPOS_ARROW = {
+    'INTEGER': pa.int64(),
+    'REAL': pa.float64(),
+    'TEXT': pa.string(),
+}
+
+def _ruta_tabla(tabla, directorio):
+    return os.path.join(directorio, tabla)
+
+def _existe_tabla(conn, nombre):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (nombre,)).fetchone() is not None
+
+def _a_tabla_arrow(df, tipos_sql):
+    """Convierte las menciones a una tabla de Arrow con tipos estables entre lotes."""
+    columnas = {}
+    for columna in df.columns:
+        tipo = _TIPOS_ARROW.get(tipos_sql.get(columna, '').upper(), pa.string())
+        if tipo == pa.int64():
+            valores = df[columna].astype('Int64') # Entero que admite nulos
+        elif tipo == pa.string():
+            valores = df[columna].astype('string')
+        else:
+            valores = df[columna]
+        columnas[columna] = pa.array(valores, type=tipo, from_pandas=True)
+
+    # 'fuente' tiene pocos valores distintos: se guarda como diccionario
+    if 'fuente' in columnas:
+        columnas['fuente'] = columnas['fuente'].dictionary_encode()
+    return pa.table(columnas)
+
+def archivar_menciones(dias=90, tabla='menciones_nuevas', db_path=None, directorio=ARCHIVO_DIR, compactar=True):
+    """
+    Mueve al archivo Parquet las menciones de `tabla` con fecha_mencion anterior a hace `dias` días
+    y las borra de SQLite. Devuelve el número de menciones archivadas.
+    Cada mención conserva en el archivo su columna `id` (INTEGER PRIMARY KEY de la tabla),
+    que VACUUM no renumera y AUTOINCREMENT nunca reutiliza.
+    Con `compactar=True` se ejecuta VACUUM para que el archivo .db realmente se achique.
+
+    En 'menciones' también se borra, en la misma transacción, la firma MinHash de las menciones
+    archivadas que no son representantes de su grupo (ver duplicados.py). Las de los
+    representantes se conservan a propósito, con sus cubetas LSH: así una mención nueva que repite
+    una noticia ya archivada sigue uniéndose a su grupo, y ai_brain toma como representante
+    a la mención de menor id que siga en el diario.
+    """
+    db_path = db_path or TABLAS[tabla]
+    fecha_corte = (datetime.datetime.now() - datetime.timedelta(days=dias)).isoformat()
+
+    conn = sqlite3.connect(db_path)
+    try:
+        if tabla == 'menciones_nuevas':
+            asegurar_id_menciones_nuevas(conn)
+        tipos_sql = {fila[1]: fila[2] for fila in conn.execute(f"PRAGMA table_info({tabla})")}
+        df = pd.read_sql_query(
+            f"SELECT * FROM {tabla} WHERE fecha_mencion < ?",
+            conn, params=(fecha_corte,)
+        )
+        if df.empty:
+            print(f"No hay menciones anteriores a {fecha_corte[:10]} en '{tabla}' para archivar.")
+            return 0
+
+        df['mes'] = df['fecha_mencion'].str[:7] # Partición: AAAA-MM
+        tipos_sql['mes'] = 'TEXT'
+
+        # Primero escribimos el archivo; solo si todo salió bien borramos de SQLite
+        ds.write_dataset(
+            _a_tabla_arrow(df, tipos_sql),
+            _ruta_tabla(tabla, directorio),
+            format='parquet',
+            partitioning=['mes'],
+            partitioning_flavor='hive',
+            basename_template=f"lote-{datetime.datetime.now():%Y%m%d%H%M%S%f}-{{i}}.parquet",
+            existing_data_behavior='overwrite_or_ignore',
+            file_options=ds.ParquetFileFormat().make_write_options(compression='zstd'),
+        )
+
+        with conn:
+            conn.execute(
+                f"DELETE FROM {tabla} WHERE fecha_mencion < ? AND id <= ?",
+                (fecha_corte, int(df['id'].max()))
+            )
+            if tabla == 'menciones' and _existe_tabla(conn, 'menciones_minhash'):
+                conn.execute('''
+                    DELETE FROM menciones_minhash
+                    WHERE mencion_id <= ? AND mencion_id != cluster_id
+                      AND mencion_id NOT IN (SELECT id FROM menciones)
+                ''', (int(df['id'].max()),))
+        if compactar:
+            conn.execute("VACUUM")
+
+        print(f"Se archivaron {len(df)} menciones de '{tabla}' en '{_ruta_tabla(tabla, directorio)}'.")
+        return len(df)
+    finally:
+        conn.close()
+
+def leer_archivo(columnas=None, tabla='menciones_nuevas', directorio=ARCHIVO_DIR, desde=None, hasta=None):
+    """
+    Lee menciones archivadas como DataFrame. Solo se leen del disco las `columnas` pedidas
+    (None = todas) y, si se indican `desde`/`hasta` (fechas ISO), solo ese rango de fechas.
+    """
+    ruta = _ruta_tabla(tabla, directorio)
+    if not os.path.isdir(ruta):
+        return pd.DataFrame(columns=columnas or [])
+
+    dataset = ds.dataset(ruta, format='parquet', partitioning='hive')
+    filtro = None
+    if desde is not None:
+        filtro = ds.field('fecha_mencion') >= desde
+    if hasta is not None:
+        condicion = ds.field('fecha_mencion') < hasta
+        filtro = condicion if filtro is None else filtro & condicion
+
+    return dataset.to_table(columns=columnas, filter=filtro).to_pandas()
+
+def leer_menciones(columnas=None, tabla='menciones_nuevas', db_path=None, directorio=ARCHIVO_DIR):
+    """
+    Historial completo de una tabla de menciones: lo que sigue en SQLite más lo archivado,
+    leyendo en ambos lados solo las `columnas` pedidas.
+    """
+    db_path = db_path or TABLAS[tabla]
+    seleccion = ", ".join(f'"{columna}"' for columna in columnas) if columnas else "*"
+
+    conn = sqlite3.connect(db_path)
+    try:
+        df_db = pd.read_sql_query(f"SELECT {seleccion} FROM {tabla}", conn)
+    finally:
+        conn.close()
+
+    df_archivo = leer_archivo(columnas=columnas or list(df_db.columns), tabla=tabla, directorio=directorio)
+    if df_archivo.empty:
+        return df_db
+    if 'fuente' in df_archivo.columns:
+        df_archivo['fuente'] = df_archivo['fuente'].astype(object)
+    return pd.concat([df_db, df_archivo], ignore_index=True)
+
+if __name__ == '__main__':
+    print("Archivando menciones antiguas...")
+    for nombre_tabla in TABLAS:
+        try:
+            archivar_menciones(dias=90, tabla=nombre_tabla)
+        except sqlite3.OperationalError as e:
+            print(f"No se pudo archivar '{nombre_tabla}': {e}")
@@ -0,0 +1,187 @@
+# cache_scraping.py
+#
+# Caché local de las páginas que descarga el scraper.
+# - Los cuerpos se guardan comprimidos (zlib) y direccionados por contenido: el nombre del
+#   archivo es el SHA-256 del cuerpo, así dos URLs con la misma página comparten archivo.
+# - Un índice SQLite guarda, por URL, el hash del cuerpo, los validadores HTTP (ETag,
+#   Last-Modified), cuándo se descargó y cuándo se usó por última vez.
+# - Dentro del TTL no se toca la red; pasado el TTL se hace una petición condicional
+#   (304 = la página no cambió). Si la caché supera `max_bytes` se borran las URLs
+#   usadas hace más tiempo (LRU).
+
+import hashlib
+import os
+import sqlite3
+import time
+import zlib
+
+import requests
+
+CACHE_DIR = 'cache_scraping'
+TTL_SEGUNDOS = 3600 # Una hora sin volver a preguntar al servidor
+MAX_BYTES = 200 * 1024 * 1024 # Tamaño máximo de la caché (comprimida)
+
+def _conectar(directorio):
+    """Abre (y si hace falta crea) el índice de la caché."""
+    os.makedirs(os.path.join(directorio, 'objetos'), exist_ok=True)
+    conn = sqlite3.connect(os.path.join(directorio, 'indice.db'))
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS respuestas (
+            url TEXT PRIMARY KEY,
+            hash_cuerpo TEXT NOT NULL,   -- SHA-256 del cuerpo (nombre del objeto en disco)
+            etag TEXT,
+            last_modified TEXT,
+            codificacion TEXT,
+            tamano INTEGER NOT NULL,     -- Bytes del objeto comprimido
+            fecha_descarga REAL NOT NULL,
+            ultimo_acceso REAL NOT NULL,
+            hash_extraido TEXT           -- Hash del último cuerpo ya procesado por el extractor
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_respuestas_acceso ON respuestas (ultimo_acceso)")
+    return conn
+
+def _ruta_objeto(directorio, hash_cuerpo):
+    return os.path.join(directorio, 'objetos', hash_cuerpo[:2], f"{hash_cuerpo}.zlib")
+
+def _leer_objeto(directorio, hash_cuerpo, codificacion):
+    with open(_ruta_objeto(directorio, hash_cuerpo), 'rb') as f:
+        return zlib.decompress(f.read()).decode(codificacion or 'utf-8', errors='replace')
+
+def _guardar_objeto(directorio, hash_cuerpo, cuerpo):
+    """Guarda el cuerpo comprimido (si no existía ya) y devuelve su tamaño en disco."""
+    ruta = _ruta_objeto(directorio, hash_cuerpo)
+    if not os.path.exists(ruta):
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        temporal = f"{ruta}.tmp"
+        with open(temporal, 'wb') as f:
+            f.write(zlib.compress(cuerpo, 6))
+        os.replace(temporal, ruta) # Escritura atómica
+    return os.path.getsize(ruta)
+
+def _borrar_si_huerfano(conn, directorio, hash_cuerpo):
+    """Borra el objeto `hash_cuerpo` si ninguna URL lo usa. Devuelve True si se borró."""
+    if conn.execute("SELECT 1 FROM respuestas WHERE hash_cuerpo = ?", (hash_cuerpo,)).fetchone() is not None:
+        return False
+    try:
+        os.remove(_ruta_objeto(directorio, hash_cuerpo))
+    except FileNotFoundError:
+        pass
+    return True
+
+def _desalojar(conn, directorio, max_bytes):
+    """Borra las URLs menos usadas recientemente hasta que la caché quepa en `max_bytes`."""
+    total = conn.execute(
+        "SELECT COALESCE(SUM(tamano), 0) FROM (SELECT MAX(tamano) AS tamano FROM respuestas GROUP BY hash_cuerpo)"
+    ).fetchone()[0]
+    if total <= max_bytes:
+        return
+
+    for url, hash_cuerpo, tamano in conn.execute(
+        "SELECT url, hash_cuerpo, tamano FROM respuestas ORDER BY ultimo_acceso"
+    ).fetchall():
+        conn.execute("DELETE FROM respuestas WHERE url = ?", (url,))
+        # El objeto solo se borra si ninguna otra URL lo usa
+        if _borrar_si_huerfano(conn, directorio, hash_cuerpo):
+            total -= tamano
+        if total <= max_bytes:
+            break
+    conn.commit()
+
+def obtener(url, ttl=TTL_SEGUNDOS, directorio=CACHE_DIR, max_bytes=MAX_BYTES, timeout=30):
+    """
+    Devuelve (html, hash_cuerpo) de `url`, usando la caché cuando es posible.
+    Lanza requests.exceptions.RequestException si hay que ir a la red y la petición falla.
+    """
+    conn = _conectar(directorio)
+    try:
+        ahora = time.time()
+        fila = conn.execute(
+            "SELECT hash_cuerpo, etag, last_modified, codificacion, fecha_descarga FROM respuestas WHERE url = ?",
+            (url,)
+        ).fetchone()
+        hash_anterior = fila[0] if fila else None
+        if fila and not os.path.exists(_ruta_objeto(directorio, fila[0])):
+            fila = None # El objeto se borró a mano: lo volvemos a descargar
+
+        # 1) Dentro del TTL: ni siquiera preguntamos al servidor
+        if fila and ahora - fila[4] < ttl:
+            conn.execute("UPDATE respuestas SET ultimo_acceso = ? WHERE url = ?", (ahora, url))
+            conn.commit()
+            return _leer_objeto(directorio, fila[0], fila[3]), fila[0]
+
+        # 2) Petición condicional con los validadores guardados
+        cabeceras = {}
+        if fila and fila[1]:
+            cabeceras['If-None-Match'] = fila[1]
+        if fila and fila[2]:
+            cabeceras['If-Modified-Since'] = fila[2]
+        response = requests.get(url, headers=cabeceras, timeout=timeout)
+
+        if response.status_code == 304 and fila:
+            conn.execute(
+                "UPDATE respuestas SET fecha_descarga = ?, ultimo_acceso = ? WHERE url = ?",
+                (ahora, ahora, url)
+            )
+            conn.commit()
+            return _leer_objeto(directorio, fila[0], fila[3]), fila[0]
+
+        response.raise_for_status() # Lanza un error para códigos de estado HTTP incorrectos
+
+        # 3) Contenido nuevo: lo guardamos
+        cuerpo = response.content
+        hash_cuerpo = hashlib.sha256(cuerpo).hexdigest()
+        tamano = _guardar_objeto(directorio, hash_cuerpo, cuerpo)
+        conn.execute('''
+            INSERT INTO respuestas (url, hash_cuerpo, etag, last_modified, codificacion, tamano, fecha_descarga, ultimo_acceso)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(url) DO UPDATE SET
+                hash_cuerpo = excluded.hash_cuerpo,
+                etag = excluded.etag,
+                last_modified = excluded.last_modified,
+                codificacion = excluded.codificacion,
+                tamano = excluded.tamano,
+                fecha_descarga = excluded.fecha_descarga,
+                ultimo_acceso = excluded.ultimo_acceso
+        ''', (url, hash_cuerpo, response.headers.get('ETag'), response.headers.get('Last-Modified'),
+              response.encoding, tamano, ahora, ahora))
+        conn.commit()
+        # Si la página cambió, el cuerpo anterior queda sin URL: se borra ya para no dejarlo huérfano
+        if hash_anterior and hash_anterior != hash_cuerpo:
+            _borrar_si_huerfano(conn, directorio, hash_anterior)
+        _desalojar(conn, directorio, max_bytes)
+        return cuerpo.decode(response.encoding or 'utf-8', errors='replace'), hash_cuerpo
+    finally:
+        conn.close()
+
+def ya_extraido(url, hash_cuerpo, directorio=CACHE_DIR):
+    """True si el extractor ya procesó exactamente este cuerpo para esta URL."""
+    conn = _conectar(directorio)
+    try:
+        fila = conn.execute("SELECT hash_extraido FROM respuestas WHERE url = ?", (url,)).fetchone()
+        return fila is not None and fila[0] == hash_cuerpo
+    finally:
+        conn.close()
+
+def marcar_extraido(url, hash_cuerpo, directorio=CACHE_DIR):
+    """Recuerda que el cuerpo `hash_cuerpo` de `url` ya pasó por el extractor."""
+    conn = _conectar(directorio)
+    try:
+        conn.execute("UPDATE respuestas SET hash_extraido = ? WHERE url = ?", (hash_cuerpo, url))
+        conn.commit()
+    finally:
+        conn.close()
+
+def instantaneas(directorio=CACHE_DIR):
+    """Recorre las páginas guardadas como pares (url, html), sin usar la red."""
+    conn = _conectar(directorio)
+    try:
+        filas = conn.execute("SELECT url, hash_cuerpo, codificacion FROM respuestas ORDER BY url").fetchall()
+    finally:
+        conn.close()
+
+    for url, hash_cuerpo, codificacion in filas:
+        try:
+            yield url, _leer_objeto(directorio, hash_cuerpo, codificacion)
+        except FileNotFoundError:
+            continue
@@ -3,8 +3,19 @@ import sqlite3
 import joblib
 import datetime
 import numpy as np # Para manejar NaNs
+import os
 
-def cargar_modelo(path='cerebro_adivinador.pkl'):
+from procesamiento_paralelo import (
+    FRAGMENTOS_POR_PROCESO, rangos_de_ids, cargar_artefacto, numero_de_procesos, calificar_en_paralelo,
+)
+
+DB_PATH = 'diario_leads.db'
+MODELO_PATH = 'cerebro_adivinador.pkl'
+
+# Las características deben ser las mismas que se usaron para entrenar el modelo
+FEATURES = ['comportamiento', 'interaccion_email', 'mensaje_longitud', 'mensaje_contiene_precios', 'mensaje_contiene_demo']
+
+def cargar_modelo(path=MODELO_PATH):
     """Carga el modelo entrenado."""
     try:
         modelo = joblib.load(path)
@@ -14,11 +25,168 @@ def cargar_modelo(path='cerebro_adivinador.pkl'):
         print(f"Error: Modelo no encontrado en {path}. Asegúrate de haber ejecutado 'modelo_calificacion.py' primero.")
         return None
 
-def calificar_nuevos_leads():
+def cargar_calificados_existentes(conn):
+    """Pares (nombre, email) que ya están en 'leads_calificados' (vacío si la tabla aún no existe)."""
+    try:
+        return pd.read_sql_query("SELECT DISTINCT nombre, email FROM leads_calificados", conn)
+    except pd.io.sql.DatabaseError:
+        return pd.DataFrame(columns=['nombre', 'email']) # Si la tabla no existe, dataframe vacío
+
+def quitar_ya_calificados(df_menciones, df_calificados_existentes):
+    """
+    Deja solo las menciones cuyo (nombre, email) no está en `df_calificados_existentes`.
+    Esto puede no ser 100% robusto si hay nombres/emails duplicados pero es un buen inicio.
+    """
+    merged_df = pd.merge(df_menciones, df_calificados_existentes, on=['nombre', 'email'], how='left', indicator=True)
+    return merged_df[merged_df['_merge'] == 'left_only'].drop(columns=['_merge'])
+
+def guardar_calificados(conn, df_nuevos_leads):
+    """
+    Añade los leads a 'leads_calificados' (la tabla se crea en el primer guardado) y se asegura
+    de que exista el índice parcial con los leads aún no alertados, ordenados por puntuación,
+    que usa la búsqueda por umbral de dashboard_bi.enviar_alerta_leads_altos.
+    """
+    df_nuevos_leads.to_sql('leads_calificados', conn, if_exists='append', index=False)
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_leads_alerta_pendiente
+        ON leads_calificados (puntuacion_intencion DESC)
+        WHERE fecha_alerta IS NULL
+    ''')
+    conn.commit()
+
+def puntuar_leads(df_nuevos_leads, modelo):
+    """
+    Calcula las características, la puntuación de intención y la necesidad
+    de un DataFrame de menciones nuevas. Devuelve el DataFrame listo para guardar.
+    """
+    # Preparar las características para la predicción, igual que en el entrenamiento
+    # Asegurarse de que todas las columnas necesarias existan y estén en el formato correcto
+    df_nuevos_leads['mensaje_longitud'] = df_nuevos_leads['mensaje'].apply(lambda x: len(str(x)) if pd.notna(x) else 0)
+    df_nuevos_leads['mensaje_contiene_precios'] = df_nuevos_leads['mensaje'].str.contains('precios|cotizacion', case=False, na=False).astype(int)
+    df_nuevos_leads['mensaje_contiene_demo'] = df_nuevos_leads['mensaje'].str.contains('demo', case=False, na=False).astype(int)
+
+    # Manejar posibles valores nulos en las columnas que usamos para predecir
+    # Puedes decidir si rellenar con 0, la media, o eliminar la fila.
+    # Aquí rellenamos con 0 para este ejemplo.
+    df_nuevos_leads['comportamiento'] = df_nuevos_leads['comportamiento'].fillna(0).astype(int)
+    df_nuevos_leads['interaccion_email'] = df_nuevos_leads['interaccion_email'].fillna(0).astype(int)
+
+    X_predict = df_nuevos_leads[FEATURES]
+
+    # Predecir la probabilidad de que sea un "buen lead" (puntuacion_intencion)
+    # predict_proba devuelve las probabilidades para cada clase (0 y 1).
+    # Queremos la probabilidad de la clase 1 (es_buen_lead=1).
+    df_nuevos_leads['puntuacion_intencion'] = modelo.predict_proba(X_predict)[:, 1] * 100 # Multiplicar por 100 para porcentaje
+
+    # --- Simulación de 'necesidad_diagnosticada' ---
+    # Esto en la realidad sería otro modelo (NLP) o reglas de negocio
+    df_nuevos_leads['necesidad_diagnosticada'] = np.where(
+        df_nuevos_leads['mensaje_contiene_precios'] == 1,
+        'Necesidad de Precios/Cotización',
+        np.where(df_nuevos_leads['mensaje_contiene_demo'] == 1,
+                 'Interés en Demostración',
+                 'Interés General')
+    )
+
+    # Aseguramos que la columna 'fecha_alerta' exista con valores nulos (NULL)
+    df_nuevos_leads['fecha_alerta'] = None
+    # El id es propio de 'menciones_nuevas'; 'leads_calificados' no tiene esa columna
+    return df_nuevos_leads.drop(columns=['id'], errors='ignore')
+
+# --- Calentamiento: dejar el modelo cargado antes de la primera calificación ---
+_modelo_caliente = None
+
+def _ejecutar_lote_de_prueba(modelo):
+    """Hace una predicción ficticia para que la primera calificación real no pague la inicialización."""
+    modelo.predict_proba(pd.DataFrame([[0] * len(FEATURES)], columns=FEATURES))
+
+def calentar_modelo(path=MODELO_PATH):
+    """
+    Carga el modelo una sola vez y ejecuta una predicción de prueba. Pensado para procesos
+    de larga duración: las siguientes llamadas a calificar_nuevos_leads reutilizan este modelo.
+    """
+    global _modelo_caliente
+    modelo = cargar_modelo(path)
+    if modelo is not None:
+        _ejecutar_lote_de_prueba(modelo)
+        _modelo_caliente = modelo
+    return modelo
+
+# --- Modo paralelo: cada proceso califica un rango de rowid de 'menciones_nuevas' ---
+_modelo_proceso = None
+_calificados_proceso = None
+
+def _iniciar_proceso(modelo_path):
+    """
+    Se ejecuta una vez por proceso: carga el modelo, lo calienta y lee una sola vez los
+    (nombre, email) ya calificados, para descartarlos en cada fragmento con un merge.
+    """
+    global _modelo_proceso, _calificados_proceso
+    _modelo_proceso = cargar_artefacto(modelo_path)
+    _ejecutar_lote_de_prueba(_modelo_proceso)
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        _calificados_proceso = cargar_calificados_existentes(conn)
+    finally:
+        conn.close()
+
+def _calificar_fragmento(inicio, fin):
+    """Lee y califica las menciones sin calificar con rowid entre `inicio` y `fin`. No escribe nada."""
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        df = pd.read_sql_query("SELECT * FROM menciones_nuevas WHERE rowid BETWEEN ? AND ?", conn, params=(inicio, fin))
+    finally:
+        conn.close()
+
+    df = quitar_ya_calificados(df, _calificados_proceso)
+    if df.empty:
+        return df
+    return puntuar_leads(df, _modelo_proceso)
+
+def calificar_nuevos_leads_paralelo(n_procesos=None):
+    """
+    Igual que `calificar_nuevos_leads`, pero reparte 'menciones_nuevas' en rangos de rowid
+    y los califica en varios procesos. Cada proceso carga el modelo una sola vez (no por fragmento)
+    y solo este proceso (el principal) escribe en la base de datos.
+    """
+    n_procesos = numero_de_procesos(n_procesos)
+    rangos = rangos_de_ids(DB_PATH, 'menciones_nuevas', n_procesos * FRAGMENTOS_POR_PROCESO)
+    if not rangos:
+        print("No hay nuevos leads para calificar.")
+        return
+
+    # Se comprueba aquí: si el modelo falta, el error ocurriría dentro de cada proceso
+    # y solo llegaría como un BrokenProcessPool
+    if not os.path.exists(MODELO_PATH):
+        print(f"Error: Modelo no encontrado en {MODELO_PATH}. Asegúrate de haber ejecutado 'modelo_calificacion.py' primero.")
+        return
+
+    resultados = calificar_en_paralelo(_calificar_fragmento, rangos, _iniciar_proceso, (MODELO_PATH,), n_procesos)
+
+    resultados = [df for df in resultados if not df.empty]
+    if not resultados:
+        print("No hay nuevos leads para calificar.")
+        return
+
+    df_nuevos_leads = pd.concat(resultados, ignore_index=True)
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        guardar_calificados(conn, df_nuevos_leads)
+        print(f"Se calificaron {len(df_nuevos_leads)} nuevos leads en {n_procesos} procesos y se guardaron en 'leads_calificados'.")
+    except Exception as e:
+        print(f"Error durante la calificación de leads: {e}")
+    finally:
+        conn.close()
+
+def calificar_nuevos_leads(n_procesos=1):
     """
     Carga menciones no calificadas, aplica el modelo y guarda los resultados.
+    Con `n_procesos` > 1 se usa el modo paralelo (`calificar_nuevos_leads_paralelo`).
     """
-    conn = sqlite3.connect('diario_leads.db')
+    if n_procesos != 1:
+        return calificar_nuevos_leads_paralelo(n_procesos)
+
+    conn = sqlite3.connect(DB_PATH)
     
     try:
        # Obtener los leads de 'menciones_nuevas' que AÚN NO están en 'leads_calificados'
@@ -28,72 +196,21 @@ def calificar_nuevos_leads():
         # Primero, cargamos todos los leads de 'menciones_nuevas'
         df_todas_menciones = pd.read_sql_query("SELECT * FROM menciones_nuevas", conn)
 
-        # Luego, cargamos los leads que ya han sido calificados
-        # Manejamos el caso si la tabla leads_calificados aún no existe
-        try:
-            df_calificados_existentes = pd.read_sql_query("SELECT nombre, email FROM leads_calificados", conn)
-        except pd.io.sql.DatabaseError:
-            df_calificados_existentes = pd.DataFrame(columns=['nombre', 'email']) # Si la tabla no existe, dataframe vacío
-
-        # Identificamos los leads que ya están calificados usando 'nombre' y 'email' como identificadores
-        # Esto puede no ser 100% robusto si hay nombres/emails duplicados pero es un buen inicio.
-        # Si tuvieras un 'lead_id' en menciones_nuevas, sería mejor usarlo.
-        merged_df = pd.merge(df_todas_menciones, df_calificados_existentes, on=['nombre', 'email'], how='left', indicator=True)
-        df_nuevos_leads = merged_df[merged_df['_merge'] == 'left_only'].drop(columns=['_merge'])
+        # Luego, cargamos los leads que ya han sido calificados y nos quedamos con los que faltan
+        df_calificados_existentes = cargar_calificados_existentes(conn)
+        df_nuevos_leads = quitar_ya_calificados(df_todas_menciones, df_calificados_existentes)
 
         if df_nuevos_leads.empty:
             print("No hay nuevos leads para calificar.")
             return
 
-        modelo = cargar_modelo()
+        modelo = _modelo_caliente or cargar_modelo()
         if modelo is None:
             return
 
-        # Preparar las características para la predicción, igual que en el entrenamiento
-        # Asegurarse de que todas las columnas necesarias existan y estén en el formato correcto
-        df_nuevos_leads['mensaje_longitud'] = df_nuevos_leads['mensaje'].apply(lambda x: len(str(x)) if pd.notna(x) else 0)
-        df_nuevos_leads['mensaje_contiene_precios'] = df_nuevos_leads['mensaje'].str.contains('precios|cotizacion', case=False, na=False).astype(int)
-        df_nuevos_leads['mensaje_contiene_demo'] = df_nuevos_leads['mensaje'].str.contains('demo', case=False, na=False).astype(int)
-
-        # Manejar posibles valores nulos en las columnas que usamos para predecir
-        # Puedes decidir si rellenar con 0, la media, o eliminar la fila.
-        # Aquí rellenamos con 0 para este ejemplo.
-        df_nuevos_leads['comportamiento'] = df_nuevos_leads['comportamiento'].fillna(0).astype(int)
-        df_nuevos_leads['interaccion_email'] = df_nuevos_leads['interaccion_email'].fillna(0).astype(int)
-        
-        # Las características deben ser las mismas que se usaron para entrenar el modelo
-        features = ['comportamiento', 'interaccion_email', 'mensaje_longitud', 'mensaje_contiene_precios', 'mensaje_contiene_demo']
-        
-        X_predict = df_nuevos_leads[features]
-        
-        # Predecir la probabilidad de que sea un "buen lead" (puntuacion_intencion)
-        # predict_proba devuelve las probabilidades para cada clase (0 y 1).
-        # Queremos la probabilidad de la clase 1 (es_buen_lead=1).
-        df_nuevos_leads['puntuacion_intencion'] = modelo.predict_proba(X_predict)[:, 1] * 100 # Multiplicar por 100 para porcentaje
-
-        # --- Simulación de 'necesidad_diagnosticada' ---
-        # Esto en la realidad sería otro modelo (NLP) o reglas de negocio
-        df_nuevos_leads['necesidad_diagnosticada'] = np.where(
-            df_nuevos_leads['mensaje_contiene_precios'] == 1, 
-            'Necesidad de Precios/Cotización',
-            np.where(df_nuevos_leads['mensaje_contiene_demo'] == 1, 
-                     'Interés en Demostración', 
-                     'Interés General')
-        )
-        
-        # Actualizar la base de datos con los resultados
-        # Utilizaremos la columna 'id' para actualizar los registros existentes
-        # Asegúrate de que tu tabla 'menciones_nuevas' tenga una columna 'id' AUTOINCREMENT
-        
-        # Crea una nueva tabla para leads calificados o actualiza la existente si tiene IDs.
-        # Para este ejemplo, crearemos una nueva tabla 'leads_calificados'
-        
-        # --- ¡NUEVA LÍNEA CLAVE AQUÍ! ---
-        # Aseguramos que la columna 'fecha_alerta' exista con valores nulos (NULL)
-        df_nuevos_leads['fecha_alerta'] = None 
-        # --- FIN NUEVA LÍNEA ---
+        df_nuevos_leads = puntuar_leads(df_nuevos_leads, modelo)
 
-        df_nuevos_leads.to_sql('leads_calificados', conn, if_exists='append', index=False)
+        guardar_calificados(conn, df_nuevos_leads)
         print(f"Se calificaron {len(df_nuevos_leads)} nuevos leads y se guardaron en 'leads_calificados'.")
 
         # Opcional: Marcar los leads como calificados en la tabla original 'menciones_nuevas'
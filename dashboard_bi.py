@@ -3,6 +3,7 @@ import sqlite3
 import matplotlib.pyplot as plt
 import seaborn as sns
 import smtplib
+import datetime
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
@@ -65,7 +66,7 @@ def enviar_alerta_leads_altos(umbral=80):
     """
     conn = sqlite3.connect('diario_leads.db')
     try:
-        df_calificados = pd.read_sql_query(f"SELECT * FROM leads_calificados WHERE puntuacion_intencion >= {umbral} AND fecha_alerta IS NULL", conn)
+        df_calificados = pd.read_sql_query("SELECT * FROM leads_calificados WHERE puntuacion_intencion >= ? AND fecha_alerta IS NULL", conn, params=(umbral,))
         
         if df_calificados.empty:
             print(f"No hay nuevos leads con puntuación >= {umbral} para alertar.")
@@ -104,7 +105,7 @@ def enviar_alerta_leads_altos(umbral=80):
             
             # Marcar los leads como alertados para no enviarles otra vez la misma alerta
             # Tendrías que añadir una columna 'fecha_alerta' en tu tabla 'leads_calificados'
-            conn.execute(f"UPDATE leads_calificados SET fecha_alerta = ? WHERE puntuacion_intencion >= {umbral} AND fecha_alerta IS NULL", (datetime.datetime.now().isoformat(),))
+            conn.execute("UPDATE leads_calificados SET fecha_alerta = ? WHERE puntuacion_intencion >= ? AND fecha_alerta IS NULL", (datetime.datetime.now().isoformat(), umbral))
             conn.commit()
 
         except Exception as e:
@@ -1,11 +1,26 @@
 # db_manager.py
 
 import sqlite3
+import threading
 import pandas as pd
 from datetime import datetime
+from collections import OrderedDict
+
+from duplicados import crear_tablas as crear_tablas_duplicados, asegurar_tablas as asegurar_tablas_duplicados, registrar_mencion
 
 DB_NAME = 'leads.db' # Este será nuestro archivo de diario secreto
 
+# Columnas de 'menciones_nuevas' (diario_leads.db), la tabla que llenan los scripts de ingesta
+COLUMNAS_MENCIONES_NUEVAS = [
+    ('nombre', 'TEXT'),
+    ('email', 'TEXT'),
+    ('mensaje', 'TEXT'),
+    ('fuente', 'TEXT'),
+    ('fecha_mencion', 'TEXT'),
+    ('comportamiento', 'INTEGER'),
+    ('interaccion_email', 'INTEGER'),
+]
+
 def init_db():
     """
     Inicializa la base de datos SQLite y crea las tablas si no existen.
@@ -50,10 +65,44 @@ def init_db():
         )
     ''')
 
+    # Índice "de prioridad": recorre los leads de mayor a menor puntuación y ya contiene
+    # las columnas que pide get_top_leads, así no hay que leer la tabla para los mejores K
+    c.execute('''
+        CREATE INDEX IF NOT EXISTS idx_leads_prioridad
+        ON leads_calificados (puntuacion_intencion DESC, fecha_calificacion DESC, empresa_id, necesidad_diagnosticada)
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_empresas_industria_localidad ON empresas (industria, localidad)")
+
+    # Índice de menciones casi duplicadas (ver duplicados.py)
+    crear_tablas_duplicados(conn)
+
     conn.commit()
     conn.close()
     print(f"Base de datos '{DB_NAME}' y tablas inicializadas. ¡Diario listo!")
 
+def asegurar_id_menciones_nuevas(conn):
+    """
+    Garantiza que 'menciones_nuevas' tenga un id estable (INTEGER PRIMARY KEY AUTOINCREMENT).
+    Sin él, SQLite puede renumerar los rowid (VACUUM) o reutilizarlos tras un DELETE,
+    y el archivo histórico y el almacén de etiquetas perderían la referencia a cada fila.
+    Si la tabla existe sin 'id' (creada por to_sql), se migra una sola vez conservando el orden.
+    """
+    columnas = [(fila[1], fila[2]) for fila in conn.execute("PRAGMA table_info(menciones_nuevas)")]
+    if any(nombre == 'id' for nombre, _ in columnas):
+        return
+
+    definiciones = ", ".join(f'"{nombre}" {tipo}' for nombre, tipo in (columnas or COLUMNAS_MENCIONES_NUEVAS))
+    conn.execute("BEGIN") # Toda la migración en una sola transacción
+    with conn:
+        if not columnas:
+            conn.execute(f"CREATE TABLE menciones_nuevas (id INTEGER PRIMARY KEY AUTOINCREMENT, {definiciones})")
+            return
+        nombres = ", ".join(f'"{nombre}"' for nombre, _ in columnas)
+        conn.execute(f"CREATE TABLE menciones_nuevas_con_id (id INTEGER PRIMARY KEY AUTOINCREMENT, {definiciones})")
+        conn.execute(f"INSERT INTO menciones_nuevas_con_id ({nombres}) SELECT {nombres} FROM menciones_nuevas ORDER BY rowid")
+        conn.execute("DROP TABLE menciones_nuevas")
+        conn.execute("ALTER TABLE menciones_nuevas_con_id RENAME TO menciones_nuevas")
+
 def add_empresa(nombre, url='', industria='', localidad=''):
     """Añade una nueva empresa al diario si no existe, o devuelve su ID si ya existe."""
     conn = sqlite3.connect(DB_NAME)
@@ -72,12 +121,17 @@ def add_empresa(nombre, url='', industria='', localidad=''):
         conn.close()
 
 def add_mencion(empresa_id, texto_mencion, fuente, fecha_mencion):
-    """Añade una pista (mención) para una empresa al diario."""
+    """
+    Añade una pista (mención) para una empresa al diario.
+    También la registra en el índice de casi duplicados, en la misma transacción.
+    """
     conn = sqlite3.connect(DB_NAME)
     c = conn.cursor()
     try:
+        asegurar_tablas_duplicados(conn, DB_NAME)
         c.execute("INSERT INTO menciones (empresa_id, texto_mencion, fuente, fecha_mencion) VALUES (?, ?, ?, ?)",
                   (empresa_id, texto_mencion, fuente, fecha_mencion))
+        registrar_mencion(conn, c.lastrowid, texto_mencion)
         conn.commit()
         return True, "Mención añadida."
     except Exception as e:
@@ -95,6 +149,7 @@ def add_calified_lead(empresa_id, puntuacion_intencion, necesidad_diagnosticada)
             VALUES (?, ?, ?)
         ''', (empresa_id, puntuacion_intencion, necesidad_diagnosticada))
         conn.commit()
+        _invalidar_top_leads()
         return True, "Lead calificado añadido."
     except sqlite3.IntegrityError:
         # Si ya existe, actualizamos la calificación
@@ -104,12 +159,37 @@ def add_calified_lead(empresa_id, puntuacion_intencion, necesidad_diagnosticada)
             WHERE empresa_id = ?
         ''', (puntuacion_intencion, necesidad_diagnosticada, empresa_id))
         conn.commit()
+        _invalidar_top_leads()
         return True, "Lead calificado actualizado."
     except Exception as e:
         return False, f"Error al calificar lead: {e}"
     finally:
         conn.close()
 
+def add_calified_leads_batch(registros):
+    """
+    Añade o actualiza varios leads calificados en una sola transacción.
+    `registros` es una lista de tuplas (empresa_id, puntuacion_intencion, necesidad_diagnosticada),
+    con una sola tupla por empresa.
+    """
+    conn = sqlite3.connect(DB_NAME)
+    try:
+        with conn:
+            conn.executemany('''
+                INSERT INTO leads_calificados (empresa_id, puntuacion_intencion, necesidad_diagnosticada)
+                VALUES (?, ?, ?)
+                ON CONFLICT(empresa_id) DO UPDATE SET
+                    puntuacion_intencion = excluded.puntuacion_intencion,
+                    necesidad_diagnosticada = excluded.necesidad_diagnosticada,
+                    fecha_calificacion = CURRENT_TIMESTAMP
+            ''', registros)
+        _invalidar_top_leads()
+        return True, f"{len(registros)} leads calificados guardados."
+    except Exception as e:
+        return False, f"Error al calificar leads: {e}"
+    finally:
+        conn.close()
+
 def get_all_empresas():
     """Obtiene todas las empresas como DataFrame."""
     conn = sqlite3.connect(DB_NAME)
@@ -117,10 +197,19 @@ def get_all_empresas():
     conn.close()
     return df
 
-def get_all_menciones():
-    """Obtiene todas las menciones como DataFrame."""
+def get_all_menciones(columnas=None, incluir_archivo=False):
+    """
+    Obtiene todas las menciones como DataFrame.
+    `columnas` limita la lectura a esas columnas; con `incluir_archivo=True` se añaden
+    también las menciones movidas al archivo Parquet (ver archivo_menciones.py).
+    """
+    if incluir_archivo:
+        from archivo_menciones import leer_menciones
+        return leer_menciones(columnas=columnas, tabla='menciones', db_path=DB_NAME)
+
+    seleccion = ", ".join(f'"{columna}"' for columna in columnas) if columnas else "*"
     conn = sqlite3.connect(DB_NAME)
-    df = pd.read_sql_query("SELECT * FROM menciones", conn)
+    df = pd.read_sql_query(f"SELECT {seleccion} FROM menciones", conn)
     conn.close()
     return df
 
@@ -144,6 +233,95 @@ def get_all_leads_calificados():
     conn.close()
     return df
 
+# --- Los mejores K leads (para ventas) ---
+# Caché de resultados de get_top_leads. Se vacía al escribir leads calificados desde este
+# proceso y, gracias a PRAGMA data_version, también cuando otro proceso modifica el diario.
+# Guarda como máximo MAX_TOP_LEADS_CACHE combinaciones de filtros (se descarta la menos usada).
+# La conexión se comparte entre hilos (p. ej. los de un servidor web), así que la caché,
+# la versión y la propia conexión se usan siempre con _top_leads_lock tomado.
+MAX_TOP_LEADS_CACHE = 128
+_top_leads_cache = OrderedDict()
+_top_leads_version = None
+_conn_top_leads = None
+_top_leads_lock = threading.Lock()
+
+def _invalidar_top_leads():
+    """Vacía la caché de get_top_leads (se llama tras cada escritura de leads calificados)."""
+    with _top_leads_lock:
+        _top_leads_cache.clear()
+
+def _conexion_top_leads():
+    """Conexión de lectura que se reutiliza entre llamadas a get_top_leads."""
+    global _conn_top_leads
+    if _conn_top_leads is None:
+        _conn_top_leads = sqlite3.connect(DB_NAME, check_same_thread=False)
+    return _conn_top_leads
+
+def get_top_leads(k=50, industria=None, localidad=None, necesidad=None):
+    """
+    Obtiene los `k` leads calificados con mayor puntuación (los más recientes primero en caso
+    de empate) como DataFrame, opcionalmente filtrados por industria, localidad y necesidad.
+    Guarda el resultado en caché hasta la próxima escritura.
+
+    El CROSS JOIN obliga a SQLite a recorrer leads_calificados por el índice idx_leads_prioridad
+    (creado por init_db) y a buscar cada empresa por su clave, deteniéndose al reunir `k` filas
+    que cumplan los filtros: sin ordenación temporal, aunque se filtre por industria o localidad.
+    Con un JOIN normal el planificador empezaría por idx_empresas_industria_localidad y tendría
+    que ordenar todos los leads de esas empresas en un B-tree temporal. La contrapartida es que
+    un filtro que casi ninguna empresa cumple obliga a recorrer más entradas del índice.
+    """
+    global _top_leads_version
+    with _top_leads_lock:
+        conn = _conexion_top_leads()
+
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if version != _top_leads_version:
+            _top_leads_cache.clear()
+            _top_leads_version = version
+
+        clave = (k, industria, localidad, necesidad)
+        if clave in _top_leads_cache:
+            _top_leads_cache.move_to_end(clave)
+            return _top_leads_cache[clave].copy()
+
+        df = _consultar_top_leads(conn, k, industria, localidad, necesidad)
+
+        _top_leads_cache[clave] = df
+        if len(_top_leads_cache) > MAX_TOP_LEADS_CACHE:
+            _top_leads_cache.popitem(last=False)
+        return df.copy()
+
+def _consultar_top_leads(conn, k, industria, localidad, necesidad):
+    """Consulta de get_top_leads, sin caché."""
+    filtros, params = [], []
+    if industria is not None:
+        filtros.append("e.industria = ?")
+        params.append(industria)
+    if localidad is not None:
+        filtros.append("e.localidad = ?")
+        params.append(localidad)
+    if necesidad is not None:
+        filtros.append("lc.necesidad_diagnosticada = ?")
+        params.append(necesidad)
+    where = f"WHERE {' AND '.join(filtros)}" if filtros else ""
+
+    return pd.read_sql_query(f'''
+        SELECT 
+            lc.id AS lead_id,
+            e.nombre AS nombre_empresa, 
+            e.industria, 
+            e.localidad, 
+            e.url,
+            lc.puntuacion_intencion, 
+            lc.necesidad_diagnosticada, 
+            lc.fecha_calificacion
+        FROM leads_calificados lc
+        CROSS JOIN empresas e ON lc.empresa_id = e.id
+        {where}
+        ORDER BY lc.puntuacion_intencion DESC, lc.fecha_calificacion DESC
+        LIMIT ?
+    ''', conn, params=params + [k])
+
 def get_menciones_by_empresa(empresa_id):
     """Obtiene menciones para una empresa específica."""
     conn = sqlite3.connect(DB_NAME)
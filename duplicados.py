@@ -0,0 +1,149 @@
+# duplicados.py
+#
+# Detector de menciones casi duplicadas (MinHash + LSH).
+# Muchas noticias sobre el mismo evento se repiten con pequeños cambios de redacción.
+# Cada mención recibe una "firma" MinHash de sus 5-gramas de caracteres; las firmas se
+# parten en bandas y cada banda se guarda en una cubeta (tabla lsh_cubetas). Dos menciones
+# que comparten alguna cubeta son candidatas, y si su similitud estimada supera el umbral
+# pasan a formar parte del mismo grupo ("cluster").
+#
+# Solo el representante de cada grupo (su primera mención) se guarda en las cubetas, así
+# buscar candidatos para una mención nueva cuesta lo mismo aunque el diario crezca.
+
+import hashlib
+import re
+import sqlite3
+
+import numpy as np
+
+NUM_PERMUTACIONES = 128
+BANDAS = 32 # 32 bandas de 4 filas: un par con similitud 0.6 es candidato con probabilidad ~0.99
+FILAS_POR_BANDA = NUM_PERMUTACIONES // BANDAS
+# Similitud de Jaccard estimada para considerar dos menciones duplicadas. Con 5-gramas de
+# caracteres, cambiar una palabra en una mención de ~20 palabras deja la similitud en ~0.9,
+# mientras que dos menciones distintas con la misma plantilla quedan por debajo de ~0.4.
+UMBRAL_SIMILITUD = 0.6
+TAMANO_SHINGLE = 5 # 5-gramas de caracteres
+
+_PRIMO = np.uint64((1 << 61) - 1)
+_MASCARA_32 = np.uint64((1 << 32) - 1)
+# Permutaciones fijas (semilla constante) para que las firmas sean comparables entre ejecuciones.
+# Con a, b < 2^31 y hashes de 32 bits, a * h + b cabe en 64 bits sin desbordar.
+_rng = np.random.RandomState(1)
+_A = _rng.randint(1, 1 << 31, NUM_PERMUTACIONES).astype(np.uint64)
+_B = _rng.randint(0, 1 << 31, NUM_PERMUTACIONES).astype(np.uint64)
+
+_tablas_listas = set() # Bases de datos donde ya se crearon las tablas en este proceso
+
+def normalizar(texto):
+    """Limpieza ligera (minúsculas, sin números ni puntuación) antes de calcular la firma."""
+    texto = re.sub(r'\d+', ' ', str(texto).lower())
+    texto = re.sub(r'[^\w\s]', ' ', texto)
+    return texto.split()
+
+def firma_minhash(texto):
+    """Firma MinHash (array de NUM_PERMUTACIONES enteros de 32 bits) del texto de una mención."""
+    texto = " ".join(normalizar(texto))
+    n = max(1, len(texto) - TAMANO_SHINGLE + 1)
+    shingles = {texto[i:i + TAMANO_SHINGLE] for i in range(n)}
+    hashes = np.array(
+        [int.from_bytes(hashlib.sha1(s.encode('utf-8')).digest()[:4], 'little') for s in shingles],
+        dtype=np.uint64
+    )
+    permutados = ((hashes[:, None] * _A + _B) % _PRIMO) & _MASCARA_32
+    return permutados.min(axis=0).astype(np.uint32)
+
+def similitud(firma_a, firma_b):
+    """Similitud de Jaccard estimada: fracción de posiciones iguales en las dos firmas."""
+    return float(np.mean(firma_a == firma_b))
+
+def claves_lsh(firma):
+    """Una clave (entero de 64 bits) por banda de la firma."""
+    return [
+        int.from_bytes(
+            hashlib.blake2b(firma[i * FILAS_POR_BANDA:(i + 1) * FILAS_POR_BANDA].tobytes(), digest_size=8).digest(),
+            'little', signed=True
+        )
+        for i in range(BANDAS)
+    ]
+
+def crear_tablas(conn):
+    """Crea las tablas del índice de duplicados si no existen."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS menciones_minhash (
+            mencion_id INTEGER PRIMARY KEY, -- id en la tabla 'menciones'
+            cluster_id INTEGER NOT NULL,    -- id de la primera mención del grupo de casi duplicados
+            firma BLOB NOT NULL
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_menciones_minhash_cluster ON menciones_minhash (cluster_id)")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS lsh_cubetas (
+            banda INTEGER NOT NULL,
+            clave INTEGER NOT NULL,
+            mencion_id INTEGER NOT NULL,
+            PRIMARY KEY (banda, clave, mencion_id)
+        ) WITHOUT ROWID
+    ''')
+    conn.commit()
+
+def asegurar_tablas(conn, db_path):
+    """Como `crear_tablas`, pero solo la primera vez por proceso y base de datos."""
+    if db_path not in _tablas_listas:
+        crear_tablas(conn)
+        _tablas_listas.add(db_path)
+
+def registrar_mencion(conn, mencion_id, texto_mencion):
+    """
+    Añade una mención al índice y devuelve su cluster_id.
+    Si se parece lo suficiente a un representante existente, se une a su grupo;
+    si no, inicia un grupo nuevo (y se convierte en su representante).
+    No hace commit: se guarda junto con la transacción de quien llama.
+    """
+    firma = firma_minhash(texto_mencion)
+    claves = claves_lsh(firma)
+
+    condiciones = " OR ".join(["(banda = ? AND clave = ?)"] * BANDAS)
+    params = [valor for banda, clave in enumerate(claves) for valor in (banda, clave)]
+    candidatos = conn.execute(f'''
+        SELECT mh.mencion_id, mh.cluster_id, mh.firma
+        FROM menciones_minhash mh
+        WHERE mh.mencion_id IN (SELECT DISTINCT mencion_id FROM lsh_cubetas WHERE {condiciones})
+    ''', params).fetchall()
+
+    cluster_id, mejor = mencion_id, UMBRAL_SIMILITUD
+    for _, candidato_cluster, candidato_firma in candidatos:
+        s = similitud(firma, np.frombuffer(candidato_firma, dtype=np.uint32))
+        if s >= mejor:
+            cluster_id, mejor = candidato_cluster, s
+
+    conn.execute(
+        "INSERT OR REPLACE INTO menciones_minhash (mencion_id, cluster_id, firma) VALUES (?, ?, ?)",
+        (mencion_id, cluster_id, firma.tobytes())
+    )
+    if cluster_id == mencion_id: # Solo los representantes van a las cubetas
+        conn.executemany(
+            "INSERT OR IGNORE INTO lsh_cubetas (banda, clave, mencion_id) VALUES (?, ?, ?)",
+            [(banda, clave, mencion_id) for banda, clave in enumerate(claves)]
+        )
+    return cluster_id
+
+def indexar_pendientes(db_path):
+    """
+    Indexa las menciones que aún no tienen firma (por ejemplo, las guardadas antes de
+    existir este índice). Devuelve cuántas se indexaron.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        asegurar_tablas(conn, db_path)
+        pendientes = conn.execute('''
+            SELECT m.id, m.texto_mencion FROM menciones m
+            WHERE NOT EXISTS (SELECT 1 FROM menciones_minhash mh WHERE mh.mencion_id = m.id)
+            ORDER BY m.id
+        ''').fetchall()
+        with conn:
+            for mencion_id, texto in pendientes:
+                registrar_mencion(conn, mencion_id, texto)
+        return len(pendientes)
+    finally:
+        conn.close()
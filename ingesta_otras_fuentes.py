@@ -2,6 +2,8 @@ import pandas as pd
 import sqlite3
 import datetime
 
+from db_manager import asegurar_id_menciones_nuevas
+
 def ingestar_formulario_contacto(nombre, email, mensaje):
     """Simula la recepción de un formulario de contacto."""
     data = [{
@@ -44,6 +46,8 @@ def guardar_en_bd(dataframe, nombre_tabla='menciones_nuevas'):
     """
     conn = sqlite3.connect('diario_leads.db')
     try:
+        if nombre_tabla == 'menciones_nuevas':
+            asegurar_id_menciones_nuevas(conn) # Cada mención recibe un id que nunca cambia
         dataframe.to_sql(nombre_tabla, conn, if_exists='append', index=False)
         print(f"Datos de '{dataframe['fuente'].iloc[0]}' guardados en la tabla '{nombre_tabla}'.")
     except Exception as e:
@@ -4,44 +4,180 @@ from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import classification_report, accuracy_score
 import joblib # Para guardar y cargar el modelo
+import math
+
+from db_manager import asegurar_id_menciones_nuevas
 
 # --- Paso 1: Preparar los datos para el entrenamiento ---
-def cargar_datos_entrenamiento():
-    """Carga los datos de menciones y simula una etiqueta de 'intención'."""
+# Columnas de 'menciones_nuevas' que necesita el entrenamiento (no hace falta leer el resto)
+COLUMNAS_ENTRENAMIENTO = ['fuente', 'mensaje', 'comportamiento', 'interaccion_email']
+FEATURES = ['comportamiento', 'interaccion_email', 'mensaje_longitud', 'mensaje_contiene_precios', 'mensaje_contiene_demo']
+
+# "Almacén de etiquetas": características y etiqueta ya calculadas para cada fila de
+# 'menciones_nuevas' (identificada por su id, que nunca se reutiliza). Se actualiza solo con las filas nuevas.
+TABLA_ETIQUETAS = 'etiquetas_entrenamiento'
+
+def etiquetar_menciones(df):
+    """Calcula la etiqueta simulada 'es_buen_lead' y las características de cada mención."""
+    # --- MUY IMPORTANTE: SIMULACIÓN DE LA ETIQUETA 'es_buen_lead' ---
+    # En la vida real, necesitarías una columna que indique si el lead SÍ compró
+    # o fue de alto valor. Aquí la simulamos para el ejemplo.
+    # Por ejemplo, leads de formulario de contacto tienen más probabilidad de ser buenos,
+    # o si el mensaje contiene ciertas palabras clave, o si el comportamiento es alto.
+    df['es_buen_lead'] = 0 # Por defecto, no es buen lead
+    df.loc[df['fuente'] == 'formulario_web', 'es_buen_lead'] = 1 # Leads de formulario son 1
+    df.loc[df['mensaje'].str.contains('precios|demo|cotizacion', case=False, na=False), 'es_buen_lead'] = 1 # Si el mensaje contiene estas palabras, es 1
+    df.loc[df['comportamiento'] > 0, 'es_buen_lead'] = 1 # Si el comportamiento es > 0, es 1
+    # Asegurarnos de que 'es_buen_lead' sea tipo int
+    df['es_buen_lead'] = df['es_buen_lead'].astype(int)
+
+    # Seleccionar las características (columnas) que el modelo usará para aprender
+    # Aquí, estamos usando 'comportamiento', 'interaccion_email' y características del mensaje
+    # Necesitamos convertir texto a números para el modelo. Esto es simplificado.
+    # Para NLP real, usarías TfidfVectorizer o similar.
+    df['mensaje_longitud'] = df['mensaje'].apply(lambda x: len(str(x)))
+    df['mensaje_contiene_precios'] = df['mensaje'].str.contains('precios|cotizacion', case=False, na=False).astype(int)
+    df['mensaje_contiene_demo'] = df['mensaje'].str.contains('demo', case=False, na=False).astype(int)
+
+    # Filtramos solo las columnas que vamos a usar como características y la etiqueta
+    return df.dropna(subset=FEATURES + ['es_buen_lead'])
+
+def _guardar_etiquetas(conn, df):
+    """Inserta en el almacén las filas etiquetadas (las que ya existan se ignoran)."""
+    columnas = ['id_mencion'] + FEATURES + ['es_buen_lead']
+    with conn:
+        conn.executemany(
+            f"INSERT OR IGNORE INTO {TABLA_ETIQUETAS} ({', '.join(columnas)}) VALUES ({', '.join('?' * len(columnas))})",
+            df[columnas].astype(int).itertuples(index=False, name=None)
+        )
+
+def actualizar_etiquetas(conn, incluir_archivo=False, reconstruir=False):
+    """
+    Etiqueta solo las filas de 'menciones_nuevas' que aún no están en el almacén
+    (id mayor que el último procesado). Devuelve cuántas filas se añadieron.
+    Con `incluir_archivo=True` también se etiquetan las menciones archivadas que falten.
+    Usa `reconstruir=True` si cambian las reglas de `etiquetar_menciones`.
+    """
+    asegurar_id_menciones_nuevas(conn)
+
+    if reconstruir:
+        conn.execute(f"DROP TABLE IF EXISTS {TABLA_ETIQUETAS}")
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {TABLA_ETIQUETAS} (
+            id_mencion INTEGER PRIMARY KEY, -- id de la fila en 'menciones_nuevas'
+            comportamiento INTEGER NOT NULL,
+            interaccion_email INTEGER NOT NULL,
+            mensaje_longitud INTEGER NOT NULL,
+            mensaje_contiene_precios INTEGER NOT NULL,
+            mensaje_contiene_demo INTEGER NOT NULL,
+            es_buen_lead INTEGER NOT NULL
+        )
+    ''')
+    conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{TABLA_ETIQUETAS}_clase ON {TABLA_ETIQUETAS} (es_buen_lead)")
+
+    ultimo = conn.execute(f"SELECT COALESCE(MAX(id_mencion), 0) FROM {TABLA_ETIQUETAS}").fetchone()[0]
+    seleccion = ", ".join(COLUMNAS_ENTRENAMIENTO)
+    df_nuevas = pd.read_sql_query(
+        f"SELECT id AS id_mencion, {seleccion} FROM menciones_nuevas WHERE id > ?",
+        conn, params=(ultimo,)
+    )
+    nuevas = 0
+    if not df_nuevas.empty:
+        df_nuevas = etiquetar_menciones(df_nuevas)
+        _guardar_etiquetas(conn, df_nuevas)
+        nuevas += len(df_nuevas)
+
+    if incluir_archivo:
+        from archivo_menciones import leer_archivo
+        df_archivo = leer_archivo(columnas=['id'] + COLUMNAS_ENTRENAMIENTO, tabla='menciones_nuevas')
+        df_archivo = df_archivo.rename(columns={'id': 'id_mencion'})
+        if not df_archivo.empty:
+            ya_etiquetadas = pd.read_sql_query(f"SELECT id_mencion FROM {TABLA_ETIQUETAS}", conn)['id_mencion']
+            df_archivo = df_archivo[~df_archivo['id_mencion'].isin(ya_etiquetadas)]
+        if not df_archivo.empty:
+            df_archivo['fuente'] = df_archivo['fuente'].astype(object)
+            df_archivo = etiquetar_menciones(df_archivo)
+            _guardar_etiquetas(conn, df_archivo)
+            nuevas += len(df_archivo)
+
+    return nuevas
+
+def repartir_muestras(conteos, max_muestras):
+    """
+    Reparte `max_muestras` entre las clases en proporción a `conteos` (método del mayor resto),
+    así la suma es exactamente `max_muestras`. Si hay cupo, cada clase recibe al menos una
+    muestra, quitándosela a la clase con más asignadas.
+    """
+    total = sum(conteos.values())
+    cuotas = {clase: max_muestras * conteo / total for clase, conteo in conteos.items()}
+    reparto = {clase: math.floor(cuota) for clase, cuota in cuotas.items()}
+    sobrantes = max_muestras - sum(reparto.values())
+    for clase in sorted(cuotas, key=lambda c: (reparto[c] - cuotas[c], c))[:sobrantes]:
+        reparto[clase] += 1
+
+    if max_muestras >= len(conteos):
+        for clase in sorted(reparto):
+            if reparto[clase] == 0:
+                mayor = max(reparto, key=lambda c: (reparto[c], c))
+                reparto[mayor] -= 1
+                reparto[clase] = 1
+    return reparto
+
+def muestrear_etiquetas(conn, max_muestras=None, semilla=42, solo_activas=False):
+    """
+    Devuelve un DataFrame del almacén de etiquetas. Con `max_muestras` se toma una muestra
+    estratificada: cada clase conserva su proporción y el total no supera `max_muestras`.
+    El orden pseudoaleatorio se calcula en SQL a partir del id y la `semilla`,
+    así la muestra es reproducible y no hace falta cargar toda la tabla en memoria.
+    El almacén conserva las etiquetas de las menciones ya archivadas; con `solo_activas=True`
+    solo se usan las de menciones que siguen en 'menciones_nuevas'.
+    """
+    columnas = ", ".join(FEATURES + ['es_buen_lead'])
+    activas = "AND id_mencion IN (SELECT id FROM menciones_nuevas)" if solo_activas else ""
+    conteos = dict(conn.execute(
+        f"SELECT es_buen_lead, COUNT(*) FROM {TABLA_ETIQUETAS} WHERE 1 = 1 {activas} GROUP BY es_buen_lead"
+    ).fetchall())
+    total = sum(conteos.values())
+    if max_muestras is None or total <= max_muestras:
+        return pd.read_sql_query(f"SELECT {columnas} FROM {TABLA_ETIQUETAS} WHERE 1 = 1 {activas}", conn)
+
+    partes = []
+    for clase, n_clase in sorted(repartir_muestras(conteos, max_muestras).items()):
+        partes.append(pd.read_sql_query(
+            f'''
+                SELECT {columnas} FROM {TABLA_ETIQUETAS}
+                WHERE es_buen_lead = ? {activas}
+                ORDER BY ((id_mencion + ?) * 2654435761) % 4294967296
+                LIMIT ?
+            ''',
+            conn, params=(clase, semilla, n_clase)
+        ))
+    return pd.concat(partes, ignore_index=True)
+
+def cargar_datos_entrenamiento(incluir_archivo=False, max_muestras=None, semilla=42):
+    """
+    Carga los datos de menciones y simula una etiqueta de 'intención'.
+    Las etiquetas se guardan en el almacén 'etiquetas_entrenamiento' y solo se calculan
+    para las filas nuevas. Con `max_muestras` se limita el tamaño del conjunto de
+    entrenamiento manteniendo la proporción de clases.
+    Con `incluir_archivo=True` también se usan las menciones archivadas en Parquet
+    (ver archivo_menciones.py), leyendo solo las columnas necesarias; si no, se entrena
+    solo con las menciones que siguen en 'menciones_nuevas'.
+    """
     conn = sqlite3.connect('diario_leads.db')
     try:
-        # Cargamos todas las menciones
-        df = pd.read_sql_query("SELECT * FROM menciones_nuevas", conn)
-        
-        # --- MUY IMPORTANTE: SIMULACIÓN DE LA ETIQUETA 'es_buen_lead' ---
-        # En la vida real, necesitarías una columna que indique si el lead SÍ compró
-        # o fue de alto valor. Aquí la simulamos para el ejemplo.
-        # Por ejemplo, leads de formulario de contacto tienen más probabilidad de ser buenos,
-        # o si el mensaje contiene ciertas palabras clave, o si el comportamiento es alto.
-        df['es_buen_lead'] = 0 # Por defecto, no es buen lead
-        df.loc[df['fuente'] == 'formulario_web', 'es_buen_lead'] = 1 # Leads de formulario son 1
-        df.loc[df['mensaje'].str.contains('precios|demo|cotizacion', case=False, na=False), 'es_buen_lead'] = 1 # Si el mensaje contiene estas palabras, es 1
-        df.loc[df['comportamiento'] > 0, 'es_buen_lead'] = 1 # Si el comportamiento es > 0, es 1
-        # Asegurarnos de que 'es_buen_lead' sea tipo int
-        df['es_buen_lead'] = df['es_buen_lead'].astype(int)
-
-        # Seleccionar las características (columnas) que el modelo usará para aprender
-        # Aquí, estamos usando 'comportamiento', 'interaccion_email' y características del mensaje
-        # Necesitamos convertir texto a números para el modelo. Esto es simplificado.
-        # Para NLP real, usarías TfidfVectorizer o similar.
-        df['mensaje_longitud'] = df['mensaje'].apply(lambda x: len(str(x)))
-        df['mensaje_contiene_precios'] = df['mensaje'].str.contains('precios|cotizacion', case=False, na=False).astype(int)
-        df['mensaje_contiene_demo'] = df['mensaje'].str.contains('demo', case=False, na=False).astype(int)
-
-        features = ['comportamiento', 'interaccion_email', 'mensaje_longitud', 'mensaje_contiene_precios', 'mensaje_contiene_demo']
-        
-        # Filtramos solo las columnas que vamos a usar como características y la etiqueta
-        df_entrenamiento = df.dropna(subset=features + ['es_buen_lead'])
+        nuevas = actualizar_etiquetas(conn, incluir_archivo=incluir_archivo)
+        if nuevas:
+            print(f"Se etiquetaron {nuevas} menciones nuevas.")
+
+        df_entrenamiento = muestrear_etiquetas(
+            conn, max_muestras=max_muestras, semilla=semilla, solo_activas=not incluir_archivo
+        )
 
-        X = df_entrenamiento[features]
+        X = df_entrenamiento[FEATURES]
         y = df_entrenamiento['es_buen_lead']
         
-        return X, y, features
+        return X, y, FEATURES
     except pd.io.sql.DatabaseError as e:
         print(f"Error al cargar datos de la base de datos: {e}. Asegúrate de que 'diario_leads.db' y la tabla 'menciones_nuevas' existen.")
         return pd.DataFrame(), pd.Series(), []
@@ -55,7 +191,11 @@ def entrenar_modelo(X, y):
         print("No hay suficientes datos para entrenar el modelo.")
         return None
 
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    # Separación estratificada (misma proporción de clases en entrenamiento y prueba),
+    # siempre que cada clase tenga al menos 2 ejemplos y la prueba tenga sitio para todas las clases
+    n_prueba = math.ceil(0.2 * len(y))
+    estratificar = y if y.value_counts().min() >= 2 and n_prueba >= y.nunique() else None
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=estratificar)
     
     # Creamos nuestro "Cerebro Adivinador" (RandomForestClassifier)
     modelo = RandomForestClassifier(n_estimators=100, random_state=42)
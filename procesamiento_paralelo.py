@@ -0,0 +1,64 @@
+# procesamiento_paralelo.py
+#
+# Utilidades para calificar leads en varios procesos a la vez.
+# La idea: partir la tabla en rangos de id ("fragmentos"), que cada proceso
+# lea y califique su rango, y que el proceso principal sea el único que escribe
+# en SQLite (SQLite solo admite un escritor a la vez).
+
+import math
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+
+import joblib
+
+FRAGMENTOS_POR_PROCESO = 4 # Más fragmentos que procesos para repartir mejor la carga
+
+def rangos_de_ids(db_path, tabla, n_fragmentos, columna='rowid'):
+    """
+    Divide los ids de `tabla` en `n_fragmentos` rangos contiguos [inicio, fin].
+    Devuelve una lista vacía si la tabla no tiene filas.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        minimo, maximo = conn.execute(f"SELECT MIN({columna}), MAX({columna}) FROM {tabla}").fetchone()
+    finally:
+        conn.close()
+
+    if minimo is None:
+        return []
+
+    paso = max(1, math.ceil((maximo - minimo + 1) / n_fragmentos))
+    return [(inicio, min(inicio + paso - 1, maximo)) for inicio in range(minimo, maximo + 1, paso)]
+
+def guardar_artefacto(objeto, path):
+    """
+    Guarda un modelo sin compresión para que los procesos puedan abrirlo con memoria mapeada.
+    """
+    joblib.dump(objeto, path)
+    return path
+
+def cargar_artefacto(path):
+    """
+    Carga un artefacto guardado con `guardar_artefacto` usando memoria mapeada.
+    Solo los arrays de numpy que el modelo guarda tal cual (p. ej. coef_ de LogisticRegression)
+    quedan compartidos entre procesos. Los árboles de scikit-learn (RandomForest) copian sus
+    arrays al cargarse, así que cada proceso tiene su propia copia; lo que se ahorra ahí es
+    cargar el modelo una vez por proceso en lugar de enviarlo con cada fragmento.
+    """
+    return joblib.load(path, mmap_mode='r')
+
+def numero_de_procesos(n_procesos=None):
+    """Número de procesos a usar: el indicado o todos los núcleos disponibles."""
+    return n_procesos or os.cpu_count() or 1
+
+def calificar_en_paralelo(funcion, rangos, inicializador, initargs=(), n_procesos=None):
+    """
+    Ejecuta `funcion(inicio, fin)` para cada rango en un ProcessPoolExecutor.
+    `inicializador(*initargs)` se ejecuta una vez por proceso (ej. para cargar el modelo),
+    no una vez por fragmento. Devuelve los resultados en el orden de `rangos`.
+    """
+    n_procesos = min(numero_de_procesos(n_procesos), len(rangos)) or 1
+    with ProcessPoolExecutor(max_workers=n_procesos, initializer=inicializador, initargs=initargs) as executor:
+        futuros = [executor.submit(funcion, inicio, fin) for inicio, fin in rangos]
+        return [futuro.result() for futuro in futuros]
@@ -0,0 +1,82 @@
+# recursos_nlp.py
+#
+# Paquete con los recursos de NLTK que usa el Cerebro Adivinador (stopwords en español,
+# modelo Punkt para separar frases y el stemmer Snowball). Se guarda en un solo archivo
+# local y se carga con una sola lectura, sin tocar la red.
+# Para crear el paquete la primera vez: python recursos_nlp.py
+
+import pickle
+
+import nltk
+from nltk.corpus import stopwords
+from nltk.stem import SnowballStemmer
+from nltk.tokenize.destructive import NLTKWordTokenizer
+
+RECURSOS_PATH = 'recursos_nlp.pkl'
+IDIOMA_PUNKT = 'english' # El mismo modelo que usa nltk.word_tokenize por defecto
+
+_recursos = None
+_tokenizador_palabras = NLTKWordTokenizer()
+
+def _cargar_punkt(idioma):
+    """Carga el modelo Punkt desde los datos locales de NLTK (nunca lo descarga)."""
+    try:
+        from nltk.tokenize.punkt import PunktTokenizer # NLTK >= 3.8.2 (datos 'punkt_tab')
+        return PunktTokenizer(idioma)
+    except ImportError:
+        return nltk.data.load(f'tokenizers/punkt/{idioma}.pickle')
+
+def construir_recursos(path=RECURSOS_PATH):
+    """
+    Crea el paquete a partir de los datos de NLTK ya instalados y lo guarda en `path`.
+    Lanza LookupError si faltan datos; en ese caso ejecuta `descargar_recursos()` una vez.
+    """
+    recursos = {
+        'stopwords': frozenset(stopwords.words('spanish')),
+        'punkt': _cargar_punkt(IDIOMA_PUNKT),
+        'stemmer': SnowballStemmer('spanish'),
+    }
+    with open(path, 'wb') as f:
+        pickle.dump(recursos, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return recursos
+
+def descargar_recursos(path=RECURSOS_PATH):
+    """Descarga los datos de NLTK (requiere red) y crea el paquete. Solo para la instalación."""
+    print("Descargando recursos de NLTK (stopwords, punkt)... esto solo se hace una vez.")
+    nltk.download('stopwords')
+    nltk.download('punkt')
+    nltk.download('punkt_tab')
+    print("Recursos de NLTK descargados.")
+    return construir_recursos(path)
+
+def cargar_recursos(path=RECURSOS_PATH):
+    """
+    Devuelve el paquete de recursos (se lee del disco solo la primera vez).
+    Si el archivo no existe, se construye con los datos locales de NLTK.
+    """
+    global _recursos
+    if _recursos is None:
+        try:
+            with open(path, 'rb') as f:
+                _recursos = pickle.load(f)
+        except FileNotFoundError:
+            try:
+                _recursos = construir_recursos(path)
+            except LookupError as e:
+                raise LookupError(
+                    f"Faltan recursos de NLTK y no existe '{path}'. "
+                    "Ejecuta 'python recursos_nlp.py' una vez (con conexión a internet)."
+                ) from e
+    return _recursos
+
+def tokenizar(texto):
+    """Equivale a nltk.word_tokenize, pero con el modelo Punkt del paquete."""
+    punkt = cargar_recursos()['punkt']
+    return [token for frase in punkt.tokenize(texto) for token in _tokenizador_palabras.tokenize(frase)]
+
+if __name__ == '__main__':
+    try:
+        construir_recursos()
+    except LookupError:
+        descargar_recursos()
+    print(f"Paquete de recursos de NLP guardado en '{RECURSOS_PATH}'.")
@@ -3,20 +3,17 @@ from bs4 import BeautifulSoup
 import pandas as pd
 import sqlite3
 import datetime
+import sys
 
-def scrape_data(url):
+import cache_scraping
+from db_manager import asegurar_id_menciones_nuevas
+
+def extraer_leads(html):
     """
-    Función para raspar datos de una URL específica.
+    Extrae los leads del HTML de una página.
     En un escenario real, adaptarías esto para cada sitio web.
     """
-    try:
-        response = requests.get(url)
-        response.raise_for_status() # Lanza un error para códigos de estado HTTP incorrectos
-    except requests.exceptions.RequestException as e:
-        print(f"Error al acceder a la URL {url}: {e}")
-        return pd.DataFrame()
-
-    soup = BeautifulSoup(response.text, 'html.parser')
+    soup = BeautifulSoup(html, 'html.parser')
     
     # --- EJEMPLO SIMPLIFICADO: ADAPTA ESTO A LA ESTRUCTURA DE LA WEB QUE QUIERAS RASPAR ---
     # Esto es solo un ejemplo. Necesitas inspeccionar el HTML de la página real
@@ -33,26 +30,78 @@ def scrape_data(url):
 
     return pd.DataFrame(leads_encontrados)
 
+def scrape_data(url, usar_cache=True, ttl=cache_scraping.TTL_SEGUNDOS):
+    """
+    Función para raspar datos de una URL específica.
+    Con `usar_cache=True` la página pasa por la caché local (ver cache_scraping.py) y,
+    si su contenido es el mismo que en la última extracción, no se vuelve a procesar.
+    Devuelve (leads, hash_cuerpo); hash_cuerpo es None si no se usó la caché o hubo un error.
+    Quien llama debe ejecutar `cache_scraping.marcar_extraido(url, hash_cuerpo)` solo después
+    de guardar los leads, para que un fallo al guardar no haga saltarse la página la próxima vez.
+    """
+    if not usar_cache:
+        try:
+            response = requests.get(url)
+            response.raise_for_status() # Lanza un error para códigos de estado HTTP incorrectos
+        except requests.exceptions.RequestException as e:
+            print(f"Error al acceder a la URL {url}: {e}")
+            return pd.DataFrame(), None
+        return extraer_leads(response.text), None
+
+    try:
+        html, hash_cuerpo = cache_scraping.obtener(url, ttl=ttl)
+    except requests.exceptions.RequestException as e:
+        print(f"Error al acceder a la URL {url}: {e}")
+        return pd.DataFrame(), None
+
+    if cache_scraping.ya_extraido(url, hash_cuerpo):
+        print(f"La página {url} no cambió desde la última extracción.")
+        return pd.DataFrame(), None
+
+    return extraer_leads(html), hash_cuerpo
+
+def reproducir_cache(extractor=extraer_leads):
+    """
+    Modo sin conexión: vuelve a ejecutar `extractor` sobre todas las páginas guardadas
+    en la caché. Útil para probar o medir extractores sin depender de la red.
+    """
+    resultados = []
+    for url, html in cache_scraping.instantaneas():
+        df = extractor(html)
+        print(f"{url}: {len(df)} leads extraídos.")
+        resultados.append(df)
+    return pd.concat(resultados, ignore_index=True) if resultados else pd.DataFrame()
+
 def guardar_en_bd(dataframe, nombre_tabla='menciones_nuevas'):
     """
-    Guarda el DataFrame en la base de datos SQLite.
+    Guarda el DataFrame en la base de datos SQLite. Devuelve True si se guardó.
     """
     conn = sqlite3.connect('diario_leads.db')
     try:
+        if nombre_tabla == 'menciones_nuevas':
+            asegurar_id_menciones_nuevas(conn) # Cada mención recibe un id que nunca cambia
         dataframe.to_sql(nombre_tabla, conn, if_exists='append', index=False)
         print(f"Datos de web scraping guardados en la tabla '{nombre_tabla}'.")
+        return True
     except Exception as e:
         print(f"Error al guardar datos en SQLite: {e}")
+        return False
     finally:
         conn.close()
 
 if __name__ == "__main__":
+    if '--reproducir' in sys.argv:
+        # python scraping_web.py --reproducir : solo re-extrae las páginas de la caché, sin red ni BD
+        print("Reproduciendo extractores sobre la caché local...")
+        print(reproducir_cache())
+        sys.exit(0)
+
     print("Iniciando web scraping...")
     
     # URL de ejemplo. ¡CAMBIA ESTO por la URL real que quieres raspar!
     url_a_raspar = "http://ejemplo.com/directorio-empresas" # Reemplaza con una URL real
     
-    nuevos_leads_web = scrape_data(url_a_raspar)
+    nuevos_leads_web, hash_cuerpo = scrape_data(url_a_raspar)
     
     if not nuevos_leads_web.empty:
         # Añadir columnas que puedan ser útiles para el modelo
@@ -60,6 +109,9 @@ if __name__ == "__main__":
         nuevos_leads_web['interaccion_email'] = 0 # Valor por defecto
         # Otras columnas como 'industria', 'tamano_empresa', si puedes extraerlas o inferirlas.
 
-        guardar_en_bd(nuevos_leads_web)
+        if guardar_en_bd(nuevos_leads_web) and hash_cuerpo:
+            cache_scraping.marcar_extraido(url_a_raspar, hash_cuerpo)
     else:
+        if hash_cuerpo: # La página se procesó pero no tenía leads: no hay nada que guardar
+            cache_scraping.marcar_extraido(url_a_raspar, hash_cuerpo)
         print("No se encontraron nuevos leads mediante web scraping o hubo un error.")
\ No newline at end of file
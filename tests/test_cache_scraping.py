@@ -0,0 +1,70 @@
+import os
+import sys
+
+import pytest
+
+pytest.importorskip("requests")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cache_scraping
+
+
+class _RespuestaFalsa:
+    def __init__(self, cuerpo):
+        self.status_code = 200
+        self.content = cuerpo
+        self.headers = {}
+        self.encoding = 'utf-8'
+
+    def raise_for_status(self):
+        pass
+
+
+def _objetos_en_disco(directorio):
+    raiz = os.path.join(directorio, 'objetos')
+    return [
+        os.path.join(carpeta, nombre)
+        for carpeta, _, nombres in os.walk(raiz)
+        for nombre in nombres if nombre.endswith('.zlib')
+    ]
+
+
+def test_url_que_cambia_no_deja_objetos_huerfanos(tmp_path, monkeypatch):
+    directorio = str(tmp_path)
+    max_bytes = 4096
+    version = {'n': 0}
+
+    def get_falso(url, headers=None, timeout=None):
+        version['n'] += 1
+        return _RespuestaFalsa(os.urandom(1000) + f"version {version['n']}".encode())
+
+    monkeypatch.setattr(cache_scraping.requests, 'get', get_falso)
+
+    for _ in range(20):
+        # ttl=0: cada llamada vuelve a la red y recibe un cuerpo distinto
+        html, hash_cuerpo = cache_scraping.obtener('http://ejemplo.com', ttl=0, directorio=directorio, max_bytes=max_bytes)
+
+    objetos = _objetos_en_disco(directorio)
+    assert len(objetos) == 1
+    assert os.path.basename(objetos[0]) == f"{hash_cuerpo}.zlib"
+    assert sum(os.path.getsize(ruta) for ruta in objetos) <= max_bytes
+
+
+def test_objeto_compartido_no_se_borra(tmp_path, monkeypatch):
+    directorio = str(tmp_path)
+    cuerpos = {'http://a.com': [b'igual', b'nuevo'], 'http://b.com': [b'igual']}
+
+    monkeypatch.setattr(
+        cache_scraping.requests, 'get',
+        lambda url, headers=None, timeout=None: _RespuestaFalsa(cuerpos[url].pop(0))
+    )
+
+    _, hash_compartido = cache_scraping.obtener('http://a.com', ttl=0, directorio=directorio)
+    cache_scraping.obtener('http://b.com', ttl=0, directorio=directorio)
+    cache_scraping.obtener('http://a.com', ttl=0, directorio=directorio) # a.com cambia; b.com sigue usando el cuerpo
+
+    html, hash_b = cache_scraping.obtener('http://b.com', ttl=3600, directorio=directorio)
+    assert hash_b == hash_compartido
+    assert html == 'igual'
+    assert len(_objetos_en_disco(directorio)) == 2